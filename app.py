@@ -3,23 +3,30 @@
 # Autores: Gustavo Jardim, Pedro Henrique Bastos e Sávio Verbicário
 
 from typing import List
+import io
 import json
 
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 import streamlit as st
 
+try:
+    import orjson
+except ImportError:  # orjson é opcional; sem ele usamos o json da stdlib
+    orjson = None
+
 from services.camara import (
     buscar_proposicoes_por_tema,
-    tramitacoes,
-    autores_por_proposicao,
     CamaraAPIError,
+    CACHE_MAX_ENTRIES,
+    CACHE_TTL,
 )
+from services.camara_async import enriquecer_em_lote
 
 from utils.transforms import (
-    df_proposicoes,
-    dias_desde,
-    parse_date,
+    datas_iso,
+    df_proposicoes_cache,
     extrair_autor_principal,
 )
 
@@ -27,6 +34,61 @@ st.set_page_config(page_title="LegiTrack BR", page_icon="📜", layout="wide")
 
 TIPOS_SUPORTADOS = ["PL", "PLP", "PEC", "MPV", "PDC"]
 
+
+def _json_bytes(dados, indent: bool = False) -> bytes:
+    """Serializa para JSON em UTF-8, usando orjson quando disponível."""
+    if orjson is not None:
+        return orjson.dumps(dados, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(dados, ensure_ascii=False, indent=2 if indent else None).encode("utf-8")
+
+
+def _ou_traco(valor) -> str:
+    """Valor para exibição, com "—" quando vazio (None, NaN ou "")."""
+    return "—" if pd.isna(valor) or valor == "" else str(valor)
+
+
+# ---------------------------------------------------------
+# Gráficos (em cache: só são reconstruídos quando os dados mudam)
+# ---------------------------------------------------------
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _fig_barras(contagem: pd.Series, coluna: str, titulo: str):
+    dados = contagem.reset_index()
+    dados.columns = [coluna, "quantidade"]
+
+    fig = px.bar(
+        dados,
+        x=coluna,
+        y="quantidade",
+        text="quantidade",
+        title=titulo,
+    )
+    fig.update_layout(showlegend=False)
+    return fig
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _fig_histograma(dias: pd.Series):
+    return px.histogram(
+        dias, nbins=20, title="Histograma de dias desde o último status"
+    )
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _fig_linha_do_tempo(eventos: pd.DataFrame):
+    """eventos tem as colunas dataHora e evento; o cache é chaveado pelo conteúdo."""
+    # Scattergl renderiza via WebGL, mais leve em tramitações longas
+    fig = go.Figure(
+        go.Scattergl(
+            x=eventos["dataHora"],
+            y=eventos["evento"],
+            mode="markers",
+            hovertemplate="%{x|%Y-%m-%d %H:%M}<br>%{y}<extra></extra>",
+        )
+    )
+    fig.update_layout(title="Linha do tempo", showlegend=False)
+    return fig
+
+
 # ---------------------------------------------------------
 # Sidebar de filtros
 # ---------------------------------------------------------
@@ -97,25 +159,38 @@ if btn_buscar:
 
             dados_filtrados = dados_filtrados[:itens_max]
 
-            df_api = df_proposicoes(dados_filtrados)
+            ids = tuple(p.get("id") or p.get("idProposicao") for p in dados_filtrados)
+            df_api = df_proposicoes_cache(ids, dados_filtrados)
 
         if df_api.empty:
             st.info("Não há dados suficientes para exibir resultados.")
             st.stop()
 
-        # Recuperar autores (somente NOME)
-        autores_lista = []
-        for _, row_api in df_api.iterrows():
-            try:
-                aut_payload = autores_por_proposicao(int(row_api["id"]))
-                autor_nome = extrair_autor_principal(aut_payload)
-            except Exception:
-                autor_nome = None
-            autores_lista.append(autor_nome)
+        # Recuperar autores (somente NOME) e tramitações, com as requisições em paralelo.
+        # Cada id é buscado uma vez só; o resultado volta ao DataFrame por join.
+        # Registros sem id ficam de fora da busca e com autor vazio.
+        ids_prop = df_api["id"].dropna().astype(int).unique().tolist()
+        with st.spinner("Carregando autores e tramitações..."):
+            lote = enriquecer_em_lote(ids_prop)
+        tram_por_id = {id_prop: item["tramitacoes"] for id_prop, item in zip(ids_prop, lote)}
+        # Falha ao buscar autores não impede a tabela: o autor fica vazio
+        autores = pd.Series(
+            [
+                None
+                if isinstance(item["autores"], CamaraAPIError)
+                else extrair_autor_principal(item["autores"])
+                for item in lote
+            ],
+            index=pd.Index(ids_prop, dtype="Int64"),
+            name="autor",
+        )
 
-        df = df_api.copy()
-        df["autor"] = autores_lista
-        df["dias_desde_status"] = df["data_status"].apply(dias_desde)
+        hoje = pd.Timestamp.today().normalize()
+        data_status = df_api["data_status"]
+
+        df = df_api.join(autores, on="id").assign(
+            dias_desde_status=(hoje - data_status.dt.normalize()).dt.days.astype("Int64"),
+        )
 
         # Resumo
         st.caption(
@@ -123,174 +198,159 @@ if btn_buscar:
             f"em {ano_val}. Exibindo as {len(df)} primeiras."
         )
 
-        # ---------------------------------------------------------
-        # Tabela principal
-        # ---------------------------------------------------------
-        st.subheader("Resultados")
-
-        st.dataframe(
-            df[
-                [
-                    "rotulo",
-                    "autor",
-                    "ementa",
-                    "situacao",
-                    "tramitacao_atual",
-                    "data_status",
-                    "dias_desde_status",
-                    "link",
-                ]
-            ],
-            use_container_width=True,
-            hide_index=True,
+        aba_tabela, aba_graficos, aba_detalhe = st.tabs(
+            ["Resultados", "Gráficos", "Detalhe + Linha do Tempo"]
         )
 
         # ---------------------------------------------------------
-        # Downloads
+        # Tabela principal + downloads
         # ---------------------------------------------------------
-        col1, col2 = st.columns(2)
-        with col1:
-            csv_bytes = df.to_csv(index=False).encode("utf-8")
-            st.download_button(
-                "⬇️ Baixar CSV",
-                data=csv_bytes,
-                file_name="legitrack_resultados.csv",
-                mime="text/csv",
-            )
-        with col2:
-            raw_json = json.dumps(dados_filtrados, ensure_ascii=False, indent=2).encode("utf-8")
-            st.download_button(
-                "⬇️ Baixar JSON original",
-                data=raw_json,
-                file_name="legitrack_raw.json",
-                mime="application/json",
+        with aba_tabela:
+            st.dataframe(
+                df[
+                    [
+                        "rotulo",
+                        "autor",
+                        "ementa",
+                        "situacao",
+                        "tramitacao_atual",
+                        "data_status",
+                        "dias_desde_status",
+                        "link",
+                    ]
+                ],
+                use_container_width=True,
+                hide_index=True,
             )
 
+            # ---------------------------------------------------------
+            # Downloads
+            # ---------------------------------------------------------
+            col1, col2 = st.columns(2)
+            with col1:
+                csv_buf = io.BytesIO()
+                df.to_csv(csv_buf, index=False, encoding="utf-8")
+                st.download_button(
+                    "⬇️ Baixar CSV",
+                    data=csv_buf.getvalue(),
+                    file_name="legitrack_resultados.csv",
+                    mime="text/csv",
+                )
+            with col2:
+                raw_json = _json_bytes(dados_filtrados, indent=True)
+                st.download_button(
+                    "⬇️ Baixar JSON original",
+                    data=raw_json,
+                    file_name="legitrack_raw.json",
+                    mime="application/json",
+                )
+
         # ---------------------------------------------------------
         # Gráficos
         # ---------------------------------------------------------
-        st.subheader("Gráficos")
-
-        g1, g2 = st.columns(2)
-
-        # 1) Situação
-        with g1:
-            sit = df["situacao"].fillna("—").value_counts().reset_index()
-            sit.columns = ["situacao", "quantidade"]
-
-            fig1 = px.bar(
-                sit,
-                x="situacao",
-                y="quantidade",
-                text="quantidade",
-                title="Distribuição por situação",
-            )
-            fig1.update_layout(showlegend=False)
-            st.plotly_chart(fig1, use_container_width=True)
-
-        # 2) Tipo
-        with g2:
-            tipos = df["siglaTipo"].value_counts().reset_index()
-            tipos.columns = ["tipo", "quantidade"]
-
-            fig2 = px.bar(
-                tipos,
-                x="tipo",
-                y="quantidade",
-                text="quantidade",
-                title="Tipos encontrados",
-            )
-            fig2.update_layout(showlegend=False)
-            st.plotly_chart(fig2, use_container_width=True)
-
-        # 3) Histograma
-        st.markdown("### Tempo desde o último status")
-        dias = df["dias_desde_status"].dropna()
-        if not dias.empty:
-            fig3 = px.histogram(
-                dias, nbins=20, title="Histograma de dias desde o último status"
-            )
-            st.plotly_chart(fig3, use_container_width=True)
-        else:
-            st.info("Sem informações de data para gerar histograma.")
+        with aba_graficos:
+            # Contagens calculadas de uma vez para todos os gráficos de barras
+            contagens = {}
+            for col in ("situacao", "siglaTipo"):
+                vc = df[col].cat.add_categories("—").fillna("—").value_counts()
+                contagens[col] = vc[vc > 0]
+
+            g1, g2 = st.columns(2)
+
+            # 1) Situação
+            with g1:
+                fig1 = _fig_barras(contagens["situacao"], "situacao", "Distribuição por situação")
+                st.plotly_chart(fig1, use_container_width=True)
+
+            # 2) Tipo
+            with g2:
+                fig2 = _fig_barras(contagens["siglaTipo"], "tipo", "Tipos encontrados")
+                st.plotly_chart(fig2, use_container_width=True)
+
+            # 3) Histograma
+            st.markdown("### Tempo desde o último status")
+            dias = df["dias_desde_status"].dropna()
+            if not dias.empty:
+                fig3 = _fig_histograma(dias)
+                st.plotly_chart(fig3, use_container_width=True)
+            else:
+                st.info("Sem informações de data para gerar histograma.")
 
         # ---------------------------------------------------------
         # Detalhes + Timeline
         # ---------------------------------------------------------
-        st.subheader("Detalhe + Linha do Tempo")
-
-        escolha = st.selectbox(
-            "Selecione uma proposição",
-            df["rotulo"].tolist(),
-        )
-        row = df[df["rotulo"] == escolha].iloc[0]
-
-        cA, cB = st.columns([2, 3])
-
-        with cA:
-            st.markdown(f"### {row['rotulo']}")
-            st.markdown(f"**Autor:** {row['autor'] or '—'}")
-            st.markdown(f"**Ementa:** {row['ementa']}")
-            st.markdown(f"**Situação:** {row['situacao'] or '—'}")
-            st.markdown(f"**Tramitação atual:** {row['tramitacao_atual'] or '—'}")
-            if row["data_status"]:
-                st.markdown(
-                    f"**Data do status:** {row['data_status'].date()} "
-                    f"({row['dias_desde_status']} dia(s) atrás)"
-                )
-            st.markdown(f"[🔗 Página oficial]({row['link']})")
-
-        with cB:
-            with st.spinner("Carregando tramitações..."):
-                tram = tramitacoes(int(row["id"]))
-
-            if tram:
-                tdf = pd.DataFrame(tram)
-                tdf["dataHora"] = tdf["dataHora"].apply(parse_date)
-                tdf = tdf.dropna(subset=["dataHora"]).sort_values("dataHora")
-                tdf["data"] = tdf["dataHora"].dt.date
-
-                # Evento (descrição)
-                desc = tdf.get("descricaoSituacao")
-                desp = tdf.get("despacho")
-                if desc is not None:
-                    tdf["evento"] = desc.fillna(desp).fillna("(sem descrição)")
-                else:
-                    tdf["evento"] = desp.fillna("(sem descrição)") if desp is not None else "(sem descrição)"
-
-                fig_t = px.scatter(
-                    tdf,
-                    x="dataHora",
-                    y=["evento"],
-                    title="Linha do tempo",
-                    hover_data={"evento": True, "dataHora": "|%Y-%m-%d %H:%M"},
-                )
-                fig_t.update_layout(showlegend=False)
-                st.plotly_chart(fig_t, use_container_width=True)
-
-                with st.expander("Ver tabela de eventos"):
-                    colunas_base = ["data", "evento"]
-                    coluna_orgao = None
-
-                    for cand in ["orgaoDestino.sigla", "siglaOrgao", "siglaOrgaoDestino"]:
-                        if cand in tdf.columns:
-                            coluna_orgao = cand
-                            break
-
-                    if coluna_orgao:
-                        tabela = tdf[colunas_base + [coluna_orgao]].rename(
-                            columns={coluna_orgao: "órgão"}
-                        )
-                    else:
-                        tabela = tdf[colunas_base]
-
-                    st.dataframe(
-                        tabela,
-                        use_container_width=True,
-                        hide_index=True,
+        with aba_detalhe:
+            escolha = st.selectbox(
+                "Selecione uma proposição",
+                df["rotulo"].tolist(),
+            )
+            # Posição de cada rótulo (mantém a primeira ocorrência, como antes)
+            posicoes = {}
+            for i, rotulo in enumerate(df["rotulo"].tolist()):
+                posicoes.setdefault(rotulo, i)
+            row = df.iloc[posicoes[escolha]]
+
+            cA, cB = st.columns([2, 3])
+
+            with cA:
+                st.markdown(f"### {row['rotulo']}")
+                st.markdown(f"**Autor:** {_ou_traco(row['autor'])}")
+                st.markdown(f"**Ementa:** {row['ementa']}")
+                st.markdown(f"**Situação:** {_ou_traco(row['situacao'])}")
+                st.markdown(f"**Tramitação atual:** {_ou_traco(row['tramitacao_atual'])}")
+                if pd.notna(row["data_status"]):
+                    st.markdown(
+                        f"**Data do status:** {row['data_status'].date()} "
+                        f"({row['dias_desde_status']} dia(s) atrás)"
                     )
-            else:
-                st.info("Sem dados de tramitação.")
+                st.markdown(f"[🔗 Página oficial]({row['link']})")
+
+            with cB:
+                tram = tram_por_id.get(row["id"], [])
+
+                if isinstance(tram, CamaraAPIError):
+                    st.error(str(tram))
+                elif tram:
+                    tdf = pd.DataFrame(tram)
+                    vazio = pd.Series(index=tdf.index, dtype=object)
+
+                    # Formatos ISO variados e com fuso: mesma conversão de df_proposicoes
+                    tdf["dataHora"] = datas_iso(tdf["dataHora"])
+                    # Evento (descrição)
+                    tdf["evento"] = (
+                        tdf.get("descricaoSituacao", vazio)
+                        .combine_first(tdf.get("despacho", vazio))
+                        .fillna("(sem descrição)")
+                    )
+                    tdf = tdf.dropna(subset=["dataHora"]).sort_values("dataHora")
+                    tdf["data"] = tdf["dataHora"].dt.date
+
+                    fig_t = _fig_linha_do_tempo(tdf[["dataHora", "evento"]])
+                    st.plotly_chart(fig_t, use_container_width=True)
+
+                    with st.expander("Ver tabela de eventos"):
+                        colunas_base = ["data", "evento"]
+                        coluna_orgao = None
+
+                        for cand in ["orgaoDestino.sigla", "siglaOrgao", "siglaOrgaoDestino"]:
+                            if cand in tdf.columns:
+                                coluna_orgao = cand
+                                break
+
+                        if coluna_orgao:
+                            tabela = tdf[colunas_base + [coluna_orgao]].rename(
+                                columns={coluna_orgao: "órgão"}
+                            )
+                        else:
+                            tabela = tdf[colunas_base]
+
+                        st.dataframe(
+                            tabela,
+                            use_container_width=True,
+                            hide_index=True,
+                        )
+                else:
+                    st.info("Sem dados de tramitação.")
 
     except CamaraAPIError as e:
         st.error(str(e))
@@ -3,12 +3,141 @@
 # Camada de acesso aos Dados Abertos da Câmara dos Deputados
 # para o app LegiTrack BR.
 
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
+from datetime import timedelta
+from pathlib import Path
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
 import requests
+import requests_cache
+import streamlit as st
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson
+
+    _json_loads = orjson.loads
+except ImportError:  # sem orjson, usamos o parser da stdlib
+    _json_loads = json.loads
 
 BASE_API = "https://dadosabertos.camara.leg.br/api/v2"
 BASE_ARQUIVOS = "https://dadosabertos.camara.leg.br/arquivos/proposicoes/json"
 
+# As respostas da API são guardadas entre reruns do Streamlit por 1 hora
+CACHE_TTL = 3600
+CACHE_MAX_ENTRIES = 4096
+
+# Os arquivos anuais são grandes e mudam pouco: ficam salvos em disco por 1 dia
+CACHE_DIR = Path(os.environ.get("LEGITRACK_CACHE_DIR", ".cache"))
+CACHE_ARQUIVO_TTL = 86400
+
+# Cache HTTP em SQLite, compartilhado entre sessões e reinícios do app.
+# Autores e detalhes quase não mudam; tramitações usam o TTL padrão.
+CACHE_HTTP_TTL = timedelta(hours=12)
+CACHE_HTTP_TTL_POR_URL = {
+    "dadosabertos.camara.leg.br/api/v2/proposicoes/*/autores": timedelta(days=7),
+    "dadosabertos.camara.leg.br/api/v2/proposicoes/*/tramitacoes": CACHE_HTTP_TTL,
+    "dadosabertos.camara.leg.br/api/v2/proposicoes/*": timedelta(days=7),
+}
+
+# Abaixo deste número de registros, um laço simples em Python filtra mais
+# rápido que str.contains (menos custo de despacho); acima, usamos Arrow.
+LIMIAR_BUSCA_ARROW = 5000
+
+# Cada ano indexado guarda todos os registros em memória: só os mais recentes
+MAX_ANOS_EM_MEMORIA = 3
+
+# Respostas que valem nova tentativa (limite de taxa e falhas do servidor)
+STATUS_RETRY = (429, 500, 502, 503, 504)
+
+# Quando a API informa que restam menos requisições que isso, esperamos
+RATE_LIMIT_MINIMO = 2
+
+
+def espera_retry_after(valor: Optional[str], padrao: float = 1.0) -> float:
+    """Converte o cabeçalho Retry-After (em segundos) para float."""
+    try:
+        return max(float(valor), 0.0)
+    except (TypeError, ValueError):
+        return padrao
+
+
+def pausa_rate_limit(headers) -> float:
+    """
+    Segundos a esperar antes da próxima chamada quando a API avisa
+    (X-RateLimit-Remaining) que a cota está acabando; 0 caso contrário.
+    """
+    restante = headers.get("X-RateLimit-Remaining")
+    if restante is not None and restante.isdigit() and int(restante) < RATE_LIMIT_MINIMO:
+        return espera_retry_after(headers.get("Retry-After"))
+    return 0.0
+
+
+def _respeitar_rate_limit(r: requests.Response, *args, **kwargs) -> None:
+    # Hook de resposta da sessão síncrona; respostas do cache não gastam cota
+    if getattr(r, "from_cache", False):
+        return
+    pausa = pausa_rate_limit(r.headers)
+    if pausa:
+        time.sleep(pausa)
+
+
+HEADERS = {"Accept": "application/json", "User-Agent": "legitrack/1.0"}
+
+
+def _criar_sessao() -> requests.Session:
+    """
+    Sessão com cache HTTP em SQLite dentro de CACHE_DIR. Se a pasta não
+    puder ser criada ou gravada, usa uma sessão comum: sem cache em disco,
+    mas o app continua funcionando.
+    """
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        sessao = requests_cache.CachedSession(
+            str(CACHE_DIR / "camara_http"),
+            backend="sqlite",
+            expire_after=CACHE_HTTP_TTL,
+            urls_expire_after={
+                # o arquivo anual já é salvo em disco por _dados_arquivo_ano
+                "dadosabertos.camara.leg.br/arquivos/*": requests_cache.DO_NOT_CACHE,
+                **CACHE_HTTP_TTL_POR_URL,
+            },
+            allowable_methods=("GET",),
+            stale_if_error=True,
+        )
+    except (OSError, sqlite3.Error):
+        sessao = requests.Session()
+
+    sessao.headers.update(HEADERS)
+    sessao.hooks["response"].append(_respeitar_rate_limit)
+    sessao.mount(
+        "https://",
+        HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=32,
+            max_retries=Retry(
+                total=5,
+                backoff_factor=0.5,
+                status_forcelist=STATUS_RETRY,
+                respect_retry_after_header=True,
+            ),
+        ),
+    )
+    return sessao
+
+
+# Sessão única: reaproveita conexões TCP/TLS entre as chamadas à Câmara
+_SESSION = _criar_sessao()
+
+# A versão assíncrona só usa cache em disco se a sessão síncrona conseguiu
+CACHE_EM_DISCO = isinstance(_SESSION, requests_cache.CachedSession)
+
 
 class CamaraAPIError(RuntimeError):
     pass
@@ -20,13 +149,48 @@ def _get_api(path: str, params: Optional[dict] = None, timeout: int = 25) -> dic
     """
     url = f"{BASE_API}{path}"
     try:
-        r = requests.get(url, params=params, timeout=timeout)
+        r = _SESSION.get(url, params=params, timeout=timeout)
         r.raise_for_status()
-        return r.json()
-    except requests.RequestException as e:
+        return _json_loads(r.content)
+    except (requests.RequestException, ValueError) as e:
         raise CamaraAPIError(f"Erro ao consultar a API da Câmara ({url}): {e}") from e
 
 
+def _dados_arquivo_ano(ano: int, url: str, timeout: int) -> Any:
+    """
+    Devolve o JSON do arquivo anual já decodificado, usando a cópia em disco
+    (CACHE_DIR) enquanto ela tiver menos de CACHE_ARQUIVO_TTL segundos.
+    Assim o download é compartilhado entre sessões e reinícios do app.
+
+    A cópia só é gravada depois que o download foi lido como JSON: uma
+    página de erro ou um arquivo truncado não ficam em cache, e uma cópia
+    corrompida é apagada e baixada de novo.
+    """
+    caminho = CACHE_DIR / f"proposicoes-{ano}.json"
+    try:
+        if time.time() - caminho.stat().st_mtime < CACHE_ARQUIVO_TTL:
+            try:
+                return _json_loads(caminho.read_bytes())
+            except ValueError:
+                caminho.unlink(missing_ok=True)
+    except OSError:
+        pass
+
+    r = _SESSION.get(url, timeout=timeout)
+    r.raise_for_status()
+    data = _json_loads(r.content)
+
+    # Falhar ao gravar o cache não deve impedir a busca
+    try:
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = caminho.with_suffix(".tmp")
+        tmp.write_bytes(r.content)
+        os.replace(tmp, caminho)
+    except OSError:
+        pass
+    return data
+
+
 def _get_arquivo_proposicoes_ano(ano: int, timeout: int = 40) -> List[Dict[str, Any]]:
     """
     Baixa o arquivo JSON de proposições de um determinado ano:
@@ -34,9 +198,7 @@ def _get_arquivo_proposicoes_ano(ano: int, timeout: int = 40) -> List[Dict[str,
     """
     url = f"{BASE_ARQUIVOS}/proposicoes-{ano}.json"
     try:
-        r = requests.get(url, timeout=timeout)
-        r.raise_for_status()
-        data = r.json()
+        data = _dados_arquivo_ano(ano, url, timeout)
 
         if isinstance(data, dict):
             if "dados" in data and isinstance(data["dados"], list):
@@ -49,12 +211,46 @@ def _get_arquivo_proposicoes_ano(ano: int, timeout: int = 40) -> List[Dict[str,
             return data
         else:
             return []
-    except requests.RequestException as e:
+    except (requests.RequestException, ValueError) as e:
         raise CamaraAPIError(
             f"Erro ao baixar arquivo de proposições de {ano} ({url}): {e}"
         ) from e
 
 
+def _texto_busca(prop: Dict[str, Any]) -> str:
+    ementa = str(prop.get("ementa", "") or "")
+    keywords = str(prop.get("keywords", "") or "")
+    resumo = str(prop.get("ementaDetalhada", "") or "")
+    return " ".join([ementa, keywords, resumo]).lower()
+
+
+@st.cache_resource(ttl=CACHE_TTL, max_entries=MAX_ANOS_EM_MEMORIA, show_spinner=False)
+def _indice_busca_ano(ano: int) -> Tuple[List[Dict[str, Any]], pd.DataFrame]:
+    """
+    Baixa as proposições do ano e calcula uma única vez o texto de busca
+    (ementa + keywords + ementaDetalhada) já em minúsculas, para que novas
+    buscas no mesmo ano não precisem normalizar tudo de novo.
+
+    Em anos grandes o índice guarda os textos como string[pyarrow], de modo
+    que o filtro por termo roda nos kernels de string do Arrow.
+    """
+    registros = _get_arquivo_proposicoes_ano(ano)
+    dtype_texto = "string[pyarrow]" if len(registros) >= LIMIAR_BUSCA_ARROW else object
+    indice = pd.DataFrame(
+        {
+            "texto": pd.Series(
+                [_texto_busca(prop) for prop in registros], dtype=dtype_texto
+            ),
+            "siglaTipo": pd.Series(
+                [str(prop.get("siglaTipo", "")).upper() for prop in registros],
+                dtype="category",
+            ),
+        }
+    )
+    return registros, indice
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
 def buscar_proposicoes_por_tema(
     termo: str,
     ano: int,
@@ -68,26 +264,23 @@ def buscar_proposicoes_por_tema(
     if not termo:
         raise ValueError("O termo de busca não pode ser vazio.")
 
-    registros = _get_arquivo_proposicoes_ano(ano)
+    registros, indice = _indice_busca_ano(ano)
 
     termo_lower = termo.lower().strip()
     tipos = [t.upper() for t in (tipos or [])]
 
-    filtradas: List[Dict[str, Any]] = []
-    for prop in registros:
-        sigla_tipo = str(prop.get("siglaTipo", "")).upper()
-
-        if tipos and sigla_tipo not in tipos:
-            continue
-
-        ementa = str(prop.get("ementa", "") or "")
-        keywords = str(prop.get("keywords", "") or "")
-        resumo = str(prop.get("ementaDetalhada", "") or "")
-
-        texto_busca = " ".join([ementa, keywords, resumo]).lower()
+    textos = indice["texto"]
+    if textos.dtype == object:
+        arr = textos.to_numpy()
+        mask = np.fromiter((termo_lower in t for t in arr), dtype=bool, count=len(arr))
+    else:
+        mask = textos.str.contains(termo_lower, regex=False).to_numpy(
+            dtype=bool, na_value=False
+        )
+    if tipos:
+        mask &= indice["siglaTipo"].isin(tipos).to_numpy()
 
-        if termo_lower in texto_busca:
-            filtradas.append(prop)
+    filtradas: List[Dict[str, Any]] = [registros[i] for i in np.flatnonzero(mask)]
 
     try:
         filtradas.sort(
@@ -100,17 +293,22 @@ def buscar_proposicoes_por_tema(
     return filtradas
 
 
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
 def detalhes_proposicao(id_prop: int) -> Dict[str, Any]:
     data = _get_api(f"/proposicoes/{id_prop}")
     return data.get("dados", {})
 
 
-def tramitacoes(id_prop: int) -> List[Dict[str, Any]]:
+# tramitacoes, autores_por_proposicao e autores_por_uri são as versões em
+# cache das funções com "_". As versões sem cache existem porque a busca em
+# lote (services.camara_async) roda fora da thread do script do Streamlit,
+# onde st.cache_data não deve ser chamado.
+def _tramitacoes(id_prop: int) -> List[Dict[str, Any]]:
     data = _get_api(f"/proposicoes/{id_prop}/tramitacoes")
     return data.get("dados", [])
 
 
-def autores_por_proposicao(id_prop: int) -> List[Dict[str, Any]]:
+def _autores_por_proposicao(id_prop: int) -> List[Dict[str, Any]]:
     """
     Busca autores em /proposicoes/{id}/autores.
     """
@@ -122,21 +320,27 @@ def autores_por_proposicao(id_prop: int) -> List[Dict[str, Any]]:
     return []
 
 
-def autores_por_uri(uri_autores: str) -> List[Dict[str, Any]]:
+def _autores_por_uri(uri_autores: str) -> List[Dict[str, Any]]:
     """
     Mantido como fallback, caso algum registro traga diretamente a URI de autores.
     """
     if not uri_autores:
         return []
     try:
-        r = requests.get(uri_autores, timeout=25)
+        r = _SESSION.get(uri_autores, timeout=25)
         r.raise_for_status()
-        data = r.json()
+        data = _json_loads(r.content)
         if isinstance(data, dict):
             return data.get("dados", [])
         elif isinstance(data, list):
             return data
         else:
             return []
-    except requests.RequestException:
+    except (requests.RequestException, ValueError):
         return []
+
+
+_em_cache = st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+tramitacoes = _em_cache(_tramitacoes)
+autores_por_proposicao = _em_cache(_autores_por_proposicao)
+autores_por_uri = _em_cache(_autores_por_uri)
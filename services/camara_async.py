@@ -0,0 +1,233 @@
+# services/camara_async.py
+#
+# Chamadas assíncronas aos Dados Abertos da Câmara, usadas para buscar
+# autores e tramitações de várias proposições em paralelo no LegiTrack BR.
+
+from typing import Optional, List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+import asyncio
+
+import streamlit as st
+from aiolimiter import AsyncLimiter
+
+from services.camara import (
+    BASE_API,
+    CACHE_DIR,
+    CACHE_EM_DISCO,
+    CACHE_HTTP_TTL,
+    CACHE_HTTP_TTL_POR_URL,
+    CACHE_MAX_ENTRIES,
+    CACHE_TTL,
+    CamaraAPIError,
+    HEADERS,
+    STATUS_RETRY,
+    _autores_por_proposicao,
+    _json_loads,
+    _tramitacoes,
+    espera_retry_after,
+    pausa_rate_limit,
+)
+
+try:
+    import aiohttp
+    from aiohttp_client_cache import CachedSession, SQLiteBackend
+except ImportError:  # sem aiohttp, enriquecer_em_lote usa um pool de threads
+    aiohttp = None
+
+# Máximo de requisições simultâneas, para não sobrecarregar a API da Câmara
+MAX_CONCORRENCIA = 32
+
+# Teto de requisições por segundo e novas tentativas em 429/5xx
+MAX_REQUISICOES_POR_SEGUNDO = 20
+MAX_TENTATIVAS = 5
+BACKOFF = 0.5
+
+
+def _extrair_dados(data: Any) -> List[Dict[str, Any]]:
+    if isinstance(data, dict):
+        return data.get("dados", [])
+    elif isinstance(data, list):
+        return data
+    return []
+
+
+async def _em_cache(
+    session: "aiohttp.ClientSession", url: str, params: Optional[dict] = None
+) -> bool:
+    """Se já há resposta válida (não expirada) para url no cache em disco."""
+    cache = getattr(session, "cache", None)
+    if cache is None:
+        return False
+    chave = cache.create_key("GET", url, params=params)
+    return await cache.get_response(chave) is not None
+
+
+async def _aget(
+    session: "aiohttp.ClientSession",
+    limitador: AsyncLimiter,
+    url: str,
+    params: Optional[dict] = None,
+) -> Any:
+    """
+    GET com teto de taxa (limitador) e novas tentativas com backoff
+    exponencial em 429/5xx, respeitando Retry-After quando presente.
+    Respostas já em cache não passam pelo limitador: não chegam à API.
+    """
+    for tentativa in range(MAX_TENTATIVAS):
+        em_cache = tentativa == 0 and await _em_cache(session, url, params)
+        async with nullcontext() if em_cache else limitador:
+            async with session.get(url, params=params) as r:
+                if r.status not in STATUS_RETRY or tentativa == MAX_TENTATIVAS - 1:
+                    r.raise_for_status()
+                    data = _json_loads(await r.read())
+                    # respostas vindas do cache não gastam cota da API
+                    pausa = 0.0 if getattr(r, "from_cache", False) else pausa_rate_limit(r.headers)
+                    break
+                pausa = espera_retry_after(
+                    r.headers.get("Retry-After"), BACKOFF * 2 ** tentativa
+                )
+        await asyncio.sleep(pausa)
+
+    if pausa:
+        await asyncio.sleep(pausa)
+    return data
+
+
+async def _aget_dados(
+    session: "aiohttp.ClientSession",
+    semaforo: asyncio.Semaphore,
+    limitador: AsyncLimiter,
+    url: str,
+) -> List[Dict[str, Any]]:
+    """
+    Busca url e devolve a lista em "dados"; em caso de erro levanta
+    CamaraAPIError. O semáforo limita quantas requisições ficam abertas
+    ao mesmo tempo.
+    """
+    async with semaforo:
+        try:
+            return _extrair_dados(await _aget(session, limitador, url))
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise CamaraAPIError(f"Erro ao consultar a API da Câmara ({url}): {e}") from e
+
+
+async def _ou_erro(coro) -> Any:
+    """Resultado de coro ou o CamaraAPIError levantado, sem derrubar o lote."""
+    try:
+        return await coro
+    except CamaraAPIError as e:
+        return e
+
+
+async def autores_por_uri_async(
+    uri_autores: str,
+    session: "aiohttp.ClientSession",
+    semaforo: asyncio.Semaphore,
+    limitador: AsyncLimiter,
+) -> List[Dict[str, Any]]:
+    """Versão assíncrona de autores_por_uri."""
+    if not uri_autores:
+        return []
+    return await _aget_dados(session, semaforo, limitador, uri_autores)
+
+
+async def tramitacoes_async(
+    id_prop: int,
+    session: "aiohttp.ClientSession",
+    semaforo: asyncio.Semaphore,
+    limitador: AsyncLimiter,
+) -> List[Dict[str, Any]]:
+    """Versão assíncrona de tramitacoes."""
+    url = f"{BASE_API}/proposicoes/{id_prop}/tramitacoes"
+    return await _aget_dados(session, semaforo, limitador, url)
+
+
+async def _buscar_uma(
+    id_prop: int,
+    session: "aiohttp.ClientSession",
+    semaforo: asyncio.Semaphore,
+    limitador: AsyncLimiter,
+) -> Dict[str, Any]:
+    uri_autores = f"{BASE_API}/proposicoes/{id_prop}/autores"
+    autores, tram = await asyncio.gather(
+        _ou_erro(autores_por_uri_async(uri_autores, session, semaforo, limitador)),
+        _ou_erro(tramitacoes_async(id_prop, session, semaforo, limitador)),
+    )
+    return {"autores": autores, "tramitacoes": tram}
+
+
+async def _buscar_todas(ids_prop: List[int]) -> List[Dict[str, Any]]:
+    semaforo = asyncio.Semaphore(MAX_CONCORRENCIA)
+    limitador = AsyncLimiter(MAX_REQUISICOES_POR_SEGUNDO, time_period=1)
+    # Conexões keep-alive e DNS em cache: um único lookup por busca
+    connector = aiohttp.TCPConnector(
+        limit_per_host=MAX_CONCORRENCIA, keepalive_timeout=30, ttl_dns_cache=300
+    )
+    timeout = aiohttp.ClientTimeout(total=25)
+    if CACHE_EM_DISCO:
+        cache = SQLiteBackend(
+            cache_name=str(CACHE_DIR / "camara_http_async.sqlite"),
+            expire_after=CACHE_HTTP_TTL,
+            urls_expire_after=CACHE_HTTP_TTL_POR_URL,
+            allowed_methods=("GET",),
+        )
+        session = CachedSession(
+            cache=cache, connector=connector, timeout=timeout, headers=HEADERS
+        )
+    else:
+        # CACHE_DIR sem permissão de escrita: segue sem cache em disco
+        session = aiohttp.ClientSession(connector=connector, timeout=timeout, headers=HEADERS)
+    async with session:
+        return await asyncio.gather(
+            *[_buscar_uma(id_prop, session, semaforo, limitador) for id_prop in ids_prop]
+        )
+
+
+def _buscar_uma_sync(id_prop: int) -> Dict[str, Any]:
+    resultado = {}
+    for campo, buscar in (("autores", _autores_por_proposicao), ("tramitacoes", _tramitacoes)):
+        try:
+            resultado[campo] = buscar(id_prop)
+        except CamaraAPIError as e:
+            resultado[campo] = e
+    return resultado
+
+
+def _buscar_lote(ids_prop: List[int]) -> List[Dict[str, Any]]:
+    if aiohttp is None:
+        # requests libera o GIL enquanto espera a rede, então threads bastam
+        with ThreadPoolExecutor(max_workers=MAX_CONCORRENCIA) as ex:
+            return list(ex.map(_buscar_uma_sync, ids_prop))
+    return asyncio.run(_buscar_todas(ids_prop))
+
+
+class _LoteComErros(Exception):
+    """Levantada de dentro do cache para que um lote com falhas não fique guardado."""
+
+    def __init__(self, lote: List[Dict[str, Any]]):
+        super().__init__("lote com erros")
+        self.lote = lote
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def _enriquecer_em_lote_cache(ids_prop: List[int]) -> List[Dict[str, Any]]:
+    lote = _buscar_lote(ids_prop)
+    if any(isinstance(v, CamaraAPIError) for item in lote for v in item.values()):
+        raise _LoteComErros(lote)
+    return lote
+
+
+def enriquecer_em_lote(ids_prop: List[int]) -> List[Dict[str, Any]]:
+    """
+    Busca autores e tramitações de várias proposições de uma vez, com todas
+    as requisições em paralelo. Retorna, na mesma ordem de ids_prop, dicts
+    no formato {"autores": [...], "tramitacoes": [...]}.
+
+    Se uma busca falhar, o valor correspondente é o próprio CamaraAPIError
+    (e não []), e o lote não entra no cache: o próximo clique tenta de novo.
+    """
+    try:
+        return _enriquecer_em_lote_cache(ids_prop)
+    except _LoteComErros as e:
+        return e.lote
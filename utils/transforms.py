@@ -4,20 +4,33 @@
 # em DataFrames prontos para análise no app LegiTrack BR.
 
 from __future__ import annotations
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from datetime import datetime, date
 
 import pandas as pd
+import streamlit as st
 from dateutil import parser as dateparser
 
+from services.camara import CACHE_MAX_ENTRIES, CACHE_TTL
+
 
 # ---------------------------------------------------------
 # Conversão de datas
 # ---------------------------------------------------------
+def _vazio(value: Any) -> bool:
+    """None, "", NaN, NaT ou pd.NA (os ausentes do pandas, inclusive em Int64)."""
+    if isinstance(value, str):
+        return value == ""
+    try:
+        return bool(pd.isna(value))
+    except (TypeError, ValueError):  # listas etc.: pd.isna devolve um array
+        return False
+
+
 def parse_date(value: Any) -> Optional[pd.Timestamp]:
     """Converte strings da API em Timestamp do pandas."""
-    if value in (None, "", pd.NaT):
+    if _vazio(value):
         return None
     try:
         dt = dateparser.parse(str(value))
@@ -26,16 +39,35 @@ def parse_date(value: Any) -> Optional[pd.Timestamp]:
         return None
 
 
+# Fuso no fim de um horário ISO-8601 ("Z", "-03:00", "+0000"); só casa
+# depois de um horário, para não confundir com o dia em "2024-01-04".
+_RE_FUSO = r"([T ]\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?)(?:Z|[+-]\d{2}(?::?\d{2})?)$"
+
+
+def datas_iso(valores: pd.Series) -> pd.Series:
+    """
+    Converte uma coluna de datas ISO-8601 da API em datetime64 sem fuso.
+
+    O formato pode variar entre linhas (com ou sem segundos, frações ou só
+    a data). O fuso, quando vem, é descartado: fica a hora local informada
+    pela API, sem conversão para UTC, para que a data não mude de dia.
+    Valores vazios ou inválidos viram NaT.
+    """
+    texto = valores.astype("string").str.replace(_RE_FUSO, r"\1", regex=True)
+    # cache=True converte só os valores únicos e depois mapeia de volta
+    return pd.to_datetime(texto, errors="coerce", format="ISO8601", cache=True)
+
+
 def dias_desde(dt: Any) -> Optional[int]:
     """Calcula dias desde dt até hoje."""
-    if dt in (None, "", pd.NaT):
+    if _vazio(dt):
         return None
     if isinstance(dt, pd.Timestamp):
         d = dt.date()
     elif isinstance(dt, datetime):
         d = dt.date()
     elif isinstance(dt, date):
-        d = d
+        d = dt
     else:
         parsed = parse_date(dt)
         if parsed is None:
@@ -47,112 +79,143 @@ def dias_desde(dt: Any) -> Optional[int]:
 
 
 # ---------------------------------------------------------
-# Auxiliar seguro para buscar campos aninhados
+# DataFrame principal de proposições
 # ---------------------------------------------------------
-def _safe_get(d: Dict[str, Any], *keys, default=None) -> Any:
-    """Busca d[key1][key2]... com fallback."""
-    cur = d
-    try:
-        for k in keys:
-            if cur is None:
-                return default
-            cur = cur.get(k)
-        return cur if cur is not None else default
-    except Exception:
-        return default
+# Cada campo pode vir com nomes diferentes (API REST x arquivo anual);
+# as tuplas estão em ordem de preferência.
+_ALIASES_ID = ("id", "idProposicao")
+_ALIASES_SIGLA = ("siglaTipo", "sigla_tipo")
+_ALIASES_NUMERO = ("numero", "numProposicao", "num")
+_ALIASES_ANO = ("ano", "anoProposicao")
+
+# status pode vir em diversos formatos
+_PREFIXOS_STATUS = ("statusProposicao", "ultimoStatus", "status_proposicao")
+
+LINK_FICHA = "https://www.camara.leg.br/proposicoesWeb/fichadetramitacao?idProposicao="
+
+# Colunas e dtypes do DataFrame de saída (vale também para lista vazia).
+# Poucos valores distintos: categoria; inteiros menores onde cabem;
+# ementa em Arrow: menos memória e buscas (str.contains) em C++.
+_ESQUEMA = {
+    "id": "Int64",
+    "siglaTipo": "category",
+    "numero": "Int32",
+    "ano": "Int16",
+    "rotulo": object,
+    "ementa": "string[pyarrow]",
+    "situacao": "category",
+    "tramitacao_atual": "category",
+    "data_status": "datetime64[ns]",
+    "link": object,
+}
+
+
+def _verdadeiro(value: Any) -> bool:
+    # NaN/NA vêm do json_normalize no lugar de chaves ausentes: contam como vazios
+    return not _vazio(value) and bool(value)
+
+
+def _coalesce(df: pd.DataFrame, colunas) -> pd.Series:
+    """
+    Primeiro valor verdadeiro entre as colunas, equivalente a `a or b or c`:
+    além de None/NaN, valores falsos como "" e 0 passam para o próximo alias.
+
+    Só olha as colunas que existem no lote e para assim que não sobra
+    nenhum valor vazio: num lote de um único esquema (só API ou só
+    arquivo anual), os aliases do outro esquema nem são visitados.
+    """
+    resultado = pd.Series(None, index=df.index, dtype=object)
+    for col in colunas:
+        if col in df.columns:
+            s = df[col].astype(object)
+            resultado = resultado.where(resultado.notna(), s.where(s.map(_verdadeiro)))
+            if resultado.notna().all():
+                break
+    return resultado
+
+
+def _texto_rotulo(convertido: pd.Series, original: pd.Series) -> pd.Series:
+    """Texto do valor numérico quando houver (45, não "45.0"); senão o original."""
+    return convertido.astype(str).where(convertido.notna(), original.astype(str))
+
+
+def _coalesce_status(df: pd.DataFrame, *campos: str) -> pd.Series:
+    return _coalesce(df, [f"{pre}.{c}" for pre in _PREFIXOS_STATUS for c in campos])
 
 
-# ---------------------------------------------------------
-# DataFrame principal de proposições
-# ---------------------------------------------------------
 def df_proposicoes(registros: List[Dict[str, Any]]) -> pd.DataFrame:
     """Transforma lista de proposições em DataFrame padronizado."""
-    linhas: List[Dict[str, Any]] = []
-
-    for p in registros:
-        id_prop = p.get("id") or p.get("idProposicao")
-        sigla_tipo = p.get("siglaTipo") or p.get("sigla_tipo")
-        numero = p.get("numero") or p.get("numProposicao") or p.get("num")
-        ano = p.get("ano") or p.get("anoProposicao")
-
-        ementa = p.get("ementa") or ""
-        ementa_det = p.get("ementaDetalhada") or ""
-
-        # status pode vir em diversos formatos
-        status = (
-            p.get("statusProposicao")
-            or p.get("ultimoStatus")
-            or p.get("status_proposicao")
-            or {}
-        )
-
-        situacao = (
-            _safe_get(status, "descricaoSituacao")
-            or _safe_get(status, "situacao")
-            or _safe_get(status, "descricaoTramitacao")
-        )
-
-        tramitacao_atual = (
-            _safe_get(status, "descricaoTramitacao")
-            or _safe_get(status, "apreciacao")
-        )
-
-        data_status_raw = (
-            _safe_get(status, "dataHora")
-            or _safe_get(status, "dataUltimoDespacho")
-            or _safe_get(status, "data")
-        )
-
-        data_status = parse_date(data_status_raw)
-
-        # link oficial
-        if id_prop:
-            link = f"https://www.camara.leg.br/proposicoesWeb/fichadetramitacao?idProposicao={id_prop}"
-        else:
-            link = ""
-
-        rotulo = None
-        if sigla_tipo and numero and ano:
-            rotulo = f"{sigla_tipo} {numero}/{ano}"
-
-        linhas.append(
-            {
-                "id": id_prop,
-                "siglaTipo": sigla_tipo,
-                "numero": numero,
-                "ano": ano,
-                "rotulo": rotulo,
-                "ementa": ementa or ementa_det,
-                "situacao": situacao,
-                "tramitacao_atual": tramitacao_atual,
-                "data_status": data_status,
-                "link": link,
-            }
-        )
-
-    if not linhas:
-        return pd.DataFrame(
-            columns=[
-                "id",
-                "siglaTipo",
-                "numero",
-                "ano",
-                "rotulo",
-                "ementa",
-                "situacao",
-                "tramitacao_atual",
-                "data_status",
-                "link",
-            ]
-        )
-
-    df = pd.DataFrame(linhas)
-    return df
+    # Achata statusProposicao etc. em colunas "statusProposicao.campo"
+    bruto = pd.json_normalize(registros, sep=".", max_level=1)
+
+    id_prop = pd.to_numeric(_coalesce(bruto, _ALIASES_ID), errors="coerce").astype("Int64")
+    sigla_tipo = _coalesce(bruto, _ALIASES_SIGLA)
+    numero_bruto = _coalesce(bruto, _ALIASES_NUMERO)
+    ano_bruto = _coalesce(bruto, _ALIASES_ANO)
+    numero = pd.to_numeric(numero_bruto, errors="coerce").astype("Int64")
+    ano = pd.to_numeric(ano_bruto, errors="coerce").astype("Int64")
+
+    # O rótulo usa os valores originais, para que números como "12A" não se percam
+    tem_rotulo = sigla_tipo.notna() & numero_bruto.notna() & ano_bruto.notna()
+    rotulo = (
+        sigla_tipo.astype(str)
+        + " "
+        + _texto_rotulo(numero, numero_bruto)
+        + "/"
+        + _texto_rotulo(ano, ano_bruto)
+    ).where(tem_rotulo, None)
+
+    df = pd.DataFrame(
+        {
+            "id": id_prop,
+            "siglaTipo": sigla_tipo,
+            "numero": numero,
+            "ano": ano,
+            "rotulo": rotulo,
+            "ementa": _coalesce(bruto, ("ementa", "ementaDetalhada")).fillna(""),
+            "situacao": _coalesce_status(
+                bruto, "descricaoSituacao", "situacao", "descricaoTramitacao"
+            ),
+            "tramitacao_atual": _coalesce_status(bruto, "descricaoTramitacao", "apreciacao"),
+            "data_status": _coalesce_status(bruto, "dataHora", "dataUltimoDespacho", "data"),
+            # link oficial; sem id, cai para a uri do registro (se houver)
+            "link": (LINK_FICHA + id_prop.astype(str)).where(
+                id_prop.notna(), _coalesce(bruto, ("uri",)).fillna("")
+            ),
+        }
+    )
+
+    # A API usa ISO-8601: o parser em C do pandas converte a coluna inteira
+    df["data_status"] = datas_iso(df["data_status"])
+    return df.astype(_ESQUEMA)
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, show_spinner=False)
+def df_proposicoes_cache(ids: Tuple[Any, ...], _registros: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Versão em cache de df_proposicoes para reruns do Streamlit.
+
+    A chave é apenas a tupla de ids (o prefixo "_" faz o Streamlit não
+    hashear a lista de registros), então ids devem corresponder a _registros.
+    """
+    return df_proposicoes(_registros)
 
 
 # ---------------------------------------------------------
 # Extrai o nome do autor principal
 # ---------------------------------------------------------
+_NOME_KEYS = ("nome", "nomeAutor", "nomeAutorPrimeiroSignatario")
+
+
+def _primeiro(d: Dict[str, Any], keys) -> Any:
+    """Primeiro valor não vazio de d entre as chaves, na ordem."""
+    for k in keys:
+        v = d.get(k)
+        if v:
+            return v
+    return None
+
+
 def extrair_autor_principal(autores_payload: List[Dict[str, Any]]) -> Optional[str]:
     """
     Extrai o NOME do autor principal a partir de /proposicoes/{id}/autores.
@@ -164,19 +227,8 @@ def extrair_autor_principal(autores_payload: List[Dict[str, Any]]) -> Optional[s
     if not autores_payload:
         return None
 
-    deputado = None
-    for a in autores_payload:
-        tipo = (a.get("tipo") or "").lower()
-        if "deputado" in tipo:
-            deputado = a
-            break
-
-    autor = deputado or autores_payload[0]
-
-    nome = (
-        autor.get("nome")
-        or autor.get("nomeAutor")
-        or autor.get("nomeAutorPrimeiroSignatario")
+    autor = next(
+        (a for a in autores_payload if "deputado" in (a.get("tipo") or "").casefold()),
+        autores_payload[0],
     )
-
-    return nome
+    return _primeiro(autor, _NOME_KEYS)